@@ -0,0 +1,264 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import uuid
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+try:
+    from .preprocess import NULL_IDENTIFIER_VALUES
+except ImportError:
+    from preprocess import NULL_IDENTIFIER_VALUES
+
+AUDIT_STORE_FILE = os.getenv("AUDIT_STORE_FILE", "audit_store.db")
+
+# SQLite caps bound parameters per statement; IN (...) lookups are chunked below this
+MAX_QUERY_PARAMS = 900
+
+# clean_data() invents "Record N" names for ledgers without an entity column and fills
+# blank names with "UNKNOWN". Neither is an identity, so they must never link rows across runs.
+GENERATED_ENTITY = re.compile(r"^record \d+$")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS audit_runs (
+    run_id TEXT PRIMARY KEY,
+    file_name TEXT,
+    source TEXT,
+    created_at TEXT NOT NULL,
+    row_count INTEGER,
+    high_risk_count INTEGER,
+    money_at_risk TEXT
+);
+CREATE TABLE IF NOT EXISTS audit_rows (
+    row_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id TEXT NOT NULL REFERENCES audit_runs(run_id),
+    entity TEXT,
+    entity_key TEXT,
+    department TEXT,
+    department_key TEXT,
+    amount REAL,
+    risk_score INTEGER,
+    rule_score INTEGER,
+    ml_score INTEGER,
+    network_score INTEGER,
+    reasons TEXT
+);
+CREATE TABLE IF NOT EXISTS audit_identifiers (
+    identifier TEXT NOT NULL,
+    value TEXT NOT NULL,
+    row_id INTEGER NOT NULL REFERENCES audit_rows(row_id)
+);
+CREATE INDEX IF NOT EXISTS idx_runs_created ON audit_runs(created_at);
+CREATE INDEX IF NOT EXISTS idx_rows_entity ON audit_rows(entity_key, run_id);
+CREATE INDEX IF NOT EXISTS idx_rows_department ON audit_rows(department_key, run_id);
+CREATE INDEX IF NOT EXISTS idx_rows_run_risk ON audit_rows(run_id, risk_score);
+CREATE INDEX IF NOT EXISTS idx_identifiers_value ON audit_identifiers(identifier, value, row_id);
+"""
+
+
+def _normalize(value: Any) -> str:
+    return str(value).strip().lower()
+
+
+def _entity_key(entity: Any) -> Optional[str]:
+    key = _normalize(entity)
+    if key in NULL_IDENTIFIER_VALUES or GENERATED_ENTITY.match(key):
+        return None
+    return key
+
+
+def _chunks(values: List[Any], size: int = MAX_QUERY_PARAMS) -> Iterable[List[Any]]:
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+
+class AuditStore:
+    """SQLite-backed history of audit runs, indexed by entity, identifier and department."""
+
+    def __init__(self, path: str = AUDIT_STORE_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+
+    def _query(self, sql: str, params: Iterable[Any] = ()) -> List[sqlite3.Row]:
+        with self._lock:
+            return self._conn.execute(sql, tuple(params)).fetchall()
+
+    def record_runs(self, reports: List[Tuple[str, Dict[str, Any]]], source: str = "analyze") -> List[str]:
+        """
+        Persists (file name, report) pairs in one transaction and returns their run ids.
+        Prior-run risk is looked up before the inserts, so runs saved together are never
+        each other's history, and attached to the rows afterwards, so it is never stored as a finding.
+        """
+        with self._lock, self._conn:
+            priors = [self._lookup_prior_risk(report.get("results", [])) for _, report in reports]
+            run_ids = [self._insert_run(file_name, report, source) for file_name, report in reports]
+
+        for (_, report), prior in zip(reports, priors):
+            self._attach_prior_risk(report.get("results", []), *prior)
+        return run_ids
+
+    def _insert_run(self, file_name: str, report: Dict[str, Any], source: str) -> str:
+        run_id = f"AUD-{uuid.uuid4().hex[:12]}"
+        results = report.get("results", [])
+
+        self._conn.execute(
+            "INSERT INTO audit_runs VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (run_id, file_name, source, datetime.now().isoformat(), len(results),
+             report.get("high_risk_count", 0), report.get("money_at_risk"))
+        )
+        identifier_rows = []
+        for r in results:
+            cursor = self._conn.execute(
+                "INSERT INTO audit_rows (run_id, entity, entity_key, department, department_key, amount,"
+                " risk_score, rule_score, ml_score, network_score, reasons)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (run_id, r["entity"], _entity_key(r["entity"]), r["department"], _normalize(r["department"]),
+                 r["amount"], r["risk_score"], r["rule_score"], r["ml_score"], r["network_score"],
+                 json.dumps(r["reasons"]))
+            )
+            identifier_rows.extend(
+                (col, _normalize(val), cursor.lastrowid) for col, val in r.get("identifiers", {}).items()
+            )
+        self._conn.executemany("INSERT INTO audit_identifiers VALUES (?, ?, ?)", identifier_rows)
+        return run_id
+
+    def _lookup_prior_risk(self, results: List[Dict[str, Any]]) -> Tuple[Dict[str, Dict], Dict[Tuple[str, str], Dict]]:
+        """Batched indexed lookups of stored risk per entity key and (identifier, value). Caller holds the lock."""
+        entity_keys = sorted({k for k in (_entity_key(r["entity"]) for r in results) if k})
+        values_by_col = defaultdict(set)
+        for r in results:
+            for col, val in r.get("identifiers", {}).items():
+                values_by_col[col].add(_normalize(val))
+
+        entity_hits = {}
+        for chunk in _chunks(entity_keys):
+            for row in self._conn.execute(
+                "SELECT r.entity_key AS match_key, COUNT(DISTINCT r.run_id) AS audits,"
+                " MAX(r.risk_score) AS max_risk_score, MAX(u.created_at) AS last_seen"
+                " FROM audit_rows r JOIN audit_runs u ON u.run_id = r.run_id"
+                f" WHERE r.entity_key IN ({','.join('?' * len(chunk))}) GROUP BY r.entity_key",
+                chunk
+            ):
+                entity_hits[row["match_key"]] = dict(row)
+
+        identifier_hits = {}
+        for col, values in values_by_col.items():
+            for chunk in _chunks(sorted(values), MAX_QUERY_PARAMS - 1):
+                for row in self._conn.execute(
+                    "SELECT i.value AS match_key, COUNT(DISTINCT r.run_id) AS audits,"
+                    " MAX(r.risk_score) AS max_risk_score, MAX(u.created_at) AS last_seen"
+                    " FROM audit_identifiers i JOIN audit_rows r ON r.row_id = i.row_id"
+                    " JOIN audit_runs u ON u.run_id = r.run_id"
+                    f" WHERE i.identifier = ? AND i.value IN ({','.join('?' * len(chunk))})"
+                    " GROUP BY i.value",
+                    [col, *chunk]
+                ):
+                    identifier_hits[(col, row["match_key"])] = dict(row)
+
+        return entity_hits, identifier_hits
+
+    def _attach_prior_risk(
+        self,
+        results: List[Dict[str, Any]],
+        entity_hits: Dict[str, Dict],
+        identifier_hits: Dict[Tuple[str, str], Dict]
+    ) -> None:
+        """Annotates rows in-place with the risk recorded for their entity/identifiers in earlier runs."""
+        for r in results:
+            matches = []
+            entity_hit = entity_hits.get(_entity_key(r["entity"]))
+            if entity_hit:
+                matches.append({"match": "entity", "value": r["entity"], **_hit_summary(entity_hit)})
+            for col, val in r.get("identifiers", {}).items():
+                hit = identifier_hits.get((col, _normalize(val)))
+                if hit:
+                    matches.append({"match": col, "value": val, **_hit_summary(hit)})
+
+            if not matches:
+                r["prior_risk"] = None
+                continue
+
+            prior_max = max(m["max_risk_score"] for m in matches)
+            r["prior_risk"] = {"max_risk_score": prior_max, "matches": matches}
+            if prior_max > 75:
+                r["reasons"].append(f"History: Flagged high-risk in a prior audit (peak score {prior_max})")
+
+    def list_runs(self, limit: int = 20) -> List[Dict[str, Any]]:
+        rows = self._query("SELECT * FROM audit_runs ORDER BY created_at DESC LIMIT ?", (limit,))
+        return [dict(r) for r in rows]
+
+    def entity_history(self, entity: str, limit: int = 100) -> List[Dict[str, Any]]:
+        """All recorded rows for an entity, newest run first."""
+        entity_key = _entity_key(entity)
+        if entity_key is None:
+            return []
+        rows = self._query(
+            "SELECT r.*, u.file_name, u.created_at FROM audit_rows r"
+            " JOIN audit_runs u ON u.run_id = r.run_id"
+            " WHERE r.entity_key = ? ORDER BY u.created_at DESC LIMIT ?",
+            (entity_key, limit)
+        )
+        return [_row_to_dict(r) for r in rows]
+
+    def identifier_history(self, identifier: str, value: str, limit: int = 100) -> List[Dict[str, Any]]:
+        """All recorded rows carrying an identifier value (e.g. one bank account), newest first."""
+        rows = self._query(
+            "SELECT r.*, u.file_name, u.created_at FROM audit_identifiers i"
+            " JOIN audit_rows r ON r.row_id = i.row_id"
+            " JOIN audit_runs u ON u.run_id = r.run_id"
+            " WHERE i.identifier = ? AND i.value = ? ORDER BY u.created_at DESC LIMIT ?",
+            (_normalize(identifier), _normalize(value), limit)
+        )
+        return [_row_to_dict(r) for r in rows]
+
+    def top_risky_entities(
+        self,
+        last_n: int = 5,
+        limit: int = 20,
+        min_risk: int = 0,
+        department: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """Entities ranked by peak risk across the most recent `last_n` audit runs."""
+        params: List[Any] = [last_n, min_risk]
+        department_clause = ""
+        if department:
+            department_clause = " AND r.department_key = ?"
+            params.append(_normalize(department))
+        params.append(limit)
+
+        rows = self._query(
+            "SELECT MAX(r.entity) AS entity, MAX(r.department) AS department,"
+            " COUNT(DISTINCT r.run_id) AS audits, COUNT(*) AS flagged_rows,"
+            " MAX(r.risk_score) AS max_risk_score, ROUND(AVG(r.risk_score), 1) AS avg_risk_score,"
+            " SUM(r.amount) AS total_amount"
+            " FROM audit_rows r"
+            " WHERE r.run_id IN (SELECT run_id FROM audit_runs ORDER BY created_at DESC LIMIT ?)"
+            " AND r.risk_score >= ? AND r.entity_key IS NOT NULL" + department_clause +
+            " GROUP BY r.entity_key ORDER BY max_risk_score DESC, flagged_rows DESC LIMIT ?",
+            params
+        )
+        return [dict(r) for r in rows]
+
+
+def _hit_summary(hit: Dict[str, Any]) -> Dict[str, Any]:
+    return {"audits": hit["audits"], "max_risk_score": hit["max_risk_score"], "last_seen": hit["last_seen"]}
+
+
+def _row_to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+    data = dict(row)
+    data.pop("entity_key", None)
+    data.pop("department_key", None)
+    data["reasons"] = json.loads(data["reasons"] or "[]")
+    return data
+
+
+# Singleton instance
+audit_store = AuditStore()
@@ -1,7 +1,10 @@
 import json
 import os
 import hashlib
-from typing import List, Dict, Tuple, Optional
+import struct
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, List, Dict, Tuple, Optional
 from datetime import datetime
 from PIL import Image
 from PIL.ExifTags import TAGS, GPSTAGS
@@ -10,10 +13,32 @@ import imagehash
 from .services.mock_cloud import mock_s3
 
 CLAIMS_FILE = "claims_store.json"
+# Append-only JSON lines: one record per new image (or phash update), later lines win
+METADATA_CACHE_FILE = "metadata_cache.jsonl"
+
+# Only the tags used for location / fraud checks are decoded from each IFD
+IFD0_TAGS = {0x010F: "make", 0x0110: "model", 0x0131: "software", 0x0132: "modified_at"}
+EXIF_IFD_TAGS = {0x9003: "captured_at", 0x9004: "digitized_at", 0xA431: "body_serial", 0xA434: "lens_model"}
+EXIF_IFD_POINTER = 0x8769
+GPS_IFD_POINTER = 0x8825
+GPS_TAGS = {1: "GPSLatitudeRef", 2: "GPSLatitude", 3: "GPSLongitudeRef", 4: "GPSLongitude",
+            5: "GPSAltitudeRef", 6: "GPSAltitude", 7: "GPSTimeStamp", 0x1D: "GPSDateStamp"}
+# TIFF field type -> (struct code, byte size)
+TIFF_TYPES = {1: ("B", 1), 2: ("s", 1), 3: ("H", 2), 4: ("I", 4), 5: ("I", 8),
+              7: ("B", 1), 9: ("i", 4), 10: ("i", 8)}
+
+STALE_PHOTO_DAYS = 30
+# Phone/camera firmware also writes the Software tag (e.g. "17.1.2"), so only known editors are flagged
+EDITING_SOFTWARE = ("photoshop", "lightroom", "gimp", "snapseed", "picsart", "pixlr", "affinity photo",
+                    "paint.net", "facetune", "canva", "photopea", "luminar")
+# DateTime drifting this far from DateTimeOriginal means the file was re-saved after capture
+EDIT_TIME_TOLERANCE_SECONDS = 60
 
 class ClaimsManager:
     def __init__(self):
         self.claims = self.load_claims()
+        self.metadata_cache = self.load_metadata_cache()
+        self._cache_lock = threading.Lock()
 
     def load_claims(self) -> List[Dict]:
         if os.path.exists(CLAIMS_FILE):
@@ -28,30 +53,271 @@ class ClaimsManager:
         with open(CLAIMS_FILE, 'w') as f:
             json.dump(self.claims, f, indent=4)
 
+    def load_metadata_cache(self) -> Dict[str, Dict]:
+        cache = {}
+        if not os.path.exists(METADATA_CACHE_FILE):
+            return cache
+
+        lines = 0
+        with open(METADATA_CACHE_FILE, 'r') as f:
+            for line in f:
+                lines += 1
+                try:
+                    entry = json.loads(line)
+                    cache[entry["sha256"]] = entry
+                except (ValueError, KeyError, TypeError):
+                    # A torn line from an interrupted append only loses that one record
+                    print(f"⚠️ Skipping unreadable line {lines} in {METADATA_CACHE_FILE}")
+
+        # Superseded records pile up as phash updates are appended; compact once they dominate
+        if lines > 2 * len(cache):
+            tmp_path = f"{METADATA_CACHE_FILE}.tmp"
+            with open(tmp_path, 'w') as f:
+                f.writelines(json.dumps(entry) + "\n" for entry in cache.values())
+            os.replace(tmp_path, METADATA_CACHE_FILE)
+        return cache
+
+    def _append_metadata_cache(self, entries: List[Dict]):
+        """Persists new/updated cache records with a single append (cost independent of cache size)."""
+        if not entries:
+            return
+        with self._cache_lock:
+            with open(METADATA_CACHE_FILE, 'a+b') as f:
+                # Terminate a torn last line so it can't swallow the first new record
+                if f.seek(0, os.SEEK_END) > 0:
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        f.write(b"\n")
+                f.write("".join(json.dumps(e) + "\n" for e in entries).encode("utf-8"))
+
     def _get_exif_data(self, image: Image.Image) -> Dict:
         """Extracts EXIF data from an image."""
         exif_data = {}
-        if not image.getexif():
+        exif = image.getexif()
+        if not exif:
             return exif_data
 
-        for tag_id, value in image.getexif().items():
-            tag = TAGS.get(tag_id, tag_id)
-            if tag == "GPSInfo":
-                gps_data = {}
-                for t in value:
-                    sub_tag = GPSTAGS.get(t, t)
-                    gps_data[sub_tag] = value[t]
-                exif_data["GPS"] = gps_data
-            else:
-                exif_data[tag] = value
+        for tag_id, value in exif.items():
+            exif_data[TAGS.get(tag_id, tag_id)] = value
+        for tag_id, value in exif.get_ifd(EXIF_IFD_POINTER).items():
+            exif_data[TAGS.get(tag_id, tag_id)] = value
+
+        gps_ifd = exif.get_ifd(GPS_IFD_POINTER)
+        if gps_ifd:
+            exif_data["GPS"] = {GPSTAGS.get(t, t): v for t, v in gps_ifd.items()}
         return exif_data
 
+    def _find_exif_segment(self, data: bytes) -> Optional[bytes]:
+        """Walks JPEG marker headers and returns the TIFF body of the APP1/Exif segment, if any."""
+        if data[:2] != b"\xff\xd8":
+            return None
+
+        pos = 2
+        while pos + 4 <= len(data):
+            if data[pos] != 0xFF:
+                return None
+            marker = data[pos + 1]
+            if marker == 0xFF:  # fill byte
+                pos += 1
+                continue
+            if marker in (0xDA, 0xD9):  # start of scan / end of image: no metadata past here
+                return None
+            if 0xD0 <= marker <= 0xD7 or marker == 0x01:  # standalone markers carry no length
+                pos += 2
+                continue
+
+            length = struct.unpack_from(">H", data, pos + 2)[0]
+            if marker == 0xE1 and data[pos + 4:pos + 10] == b"Exif\x00\x00":
+                return data[pos + 10:pos + 2 + length]
+            pos += 2 + length
+        return None
+
+    def _read_ifd(self, tiff: bytes, offset: int, endian: str, wanted: set) -> Optional[Dict[int, Any]]:
+        """
+        Decodes only the `wanted` tags of the IFD at `offset` in a TIFF block.
+        Returns None if the offset is bogus or the entry table is truncated.
+        """
+        if offset < 8 or offset + 2 > len(tiff):
+            return None
+        count = struct.unpack_from(endian + "H", tiff, offset)[0]
+        if offset + 2 + count * 12 > len(tiff):
+            return None
+
+        entries = {}
+        for i in range(count):
+            pos = offset + 2 + i * 12
+            tag, field_type, n = struct.unpack_from(endian + "HHI", tiff, pos)
+            if tag not in wanted or field_type not in TIFF_TYPES:
+                continue
+
+            code, size = TIFF_TYPES[field_type]
+            total = size * n
+            data_pos = pos + 8 if total <= 4 else struct.unpack_from(endian + "I", tiff, pos + 8)[0]
+            if data_pos + total > len(tiff):
+                continue
+            raw = tiff[data_pos:data_pos + total]
+
+            if field_type == 2:
+                entries[tag] = raw.split(b"\x00", 1)[0].decode("ascii", "replace").strip()
+            elif field_type in (5, 10):
+                nums = struct.unpack(endian + code * (2 * n), raw)
+                entries[tag] = tuple(nums[j] / nums[j + 1] if nums[j + 1] else 0.0 for j in range(0, 2 * n, 2))
+            else:
+                entries[tag] = struct.unpack(endian + code * n, raw)
+        return entries
+
+    def _parse_jpeg_metadata(self, data: bytes) -> Optional[Dict]:
+        """
+        Fast path: reads location, capture time and camera fields straight from the
+        JPEG APP1 segment without decoding any pixel data.
+        Returns None if the bytes are not a JPEG.
+        """
+        if data[:2] != b"\xff\xd8":
+            return None
+
+        tiff = self._find_exif_segment(data)
+        endian = {b"II": "<", b"MM": ">"}.get(tiff[:2]) if tiff else None
+        ifd0 = None
+        if endian and len(tiff) >= 8:
+            ifd0 = self._read_ifd(tiff, struct.unpack_from(endian + "I", tiff, 4)[0], endian,
+                                  set(IFD0_TAGS) | {EXIF_IFD_POINTER, GPS_IFD_POINTER})
+
+        # EXIF only counts as present once IFD0 actually parsed
+        metadata = {"source": "jpeg-app1", "has_exif": ifd0 is not None}
+        if ifd0 is None:
+            metadata.update(self._build_metadata({}, {}))
+            return metadata
+
+        fields = {name: ifd0.get(tag) for tag, name in IFD0_TAGS.items()}
+        if EXIF_IFD_POINTER in ifd0:
+            exif_ifd = self._read_ifd(tiff, ifd0[EXIF_IFD_POINTER][0], endian, set(EXIF_IFD_TAGS)) or {}
+            fields.update({name: exif_ifd.get(tag) for tag, name in EXIF_IFD_TAGS.items()})
+
+        gps = {}
+        if GPS_IFD_POINTER in ifd0:
+            gps_ifd = self._read_ifd(tiff, ifd0[GPS_IFD_POINTER][0], endian, set(GPS_TAGS)) or {}
+            gps = {GPS_TAGS[tag]: value for tag, value in gps_ifd.items()}
+        metadata.update(self._build_metadata(fields, gps))
+        return metadata
+
+    def _parse_pil_metadata(self, image_file_path: str) -> Dict:
+        """Fallback for non-JPEG evidence (PNG, TIFF, ...) via PIL's EXIF reader."""
+        with Image.open(image_file_path) as img:
+            exif = self._get_exif_data(img)
+
+        names = {**IFD0_TAGS, **EXIF_IFD_TAGS}
+        fields = {name: exif.get(TAGS.get(tag, tag)) for tag, name in names.items()}
+        gps = exif.get("GPS", {})
+        metadata = {"source": "pil", "has_exif": bool(exif)}
+        metadata.update(self._build_metadata(fields, gps))
+        return metadata
+
+    def _build_metadata(self, fields: Dict, gps: Dict) -> Dict:
+        """Normalizes raw EXIF fields into the JSON-safe metadata record stored in the cache."""
+        def _clean(value):
+            if value is None:
+                return None
+            value = str(value).strip("\x00 ").strip()
+            return value or None
+
+        def _exif_time(value):
+            value = _clean(value)
+            if value is None:
+                return None
+            try:
+                return datetime.strptime(value, "%Y:%m:%d %H:%M:%S").isoformat()
+            except ValueError:
+                return value
+
+        # Every GPS field is optional; a malformed one must not fail the whole extraction
+        def _altitude():
+            alt = gps["GPSAltitude"]
+            altitude = float(alt[0] if isinstance(alt, tuple) else alt)
+            return -altitude if gps.get("GPSAltitudeRef") in (1, (1,), b"\x01") else altitude
+
+        def _gps_timestamp():
+            h, m, sec = (float(x) for x in gps["GPSTimeStamp"])
+            return f"{_clean(gps['GPSDateStamp']).replace(':', '-')}T{int(h):02d}:{int(m):02d}:{int(sec):02d}Z"
+
+        def _optional(decode):
+            try:
+                return decode()
+            except (KeyError, TypeError, ValueError, AttributeError, IndexError):
+                return None
+
+        lat, lon = self._get_lat_lon({"GPS": gps})
+        altitude = _optional(_altitude)
+        gps_timestamp = _optional(_gps_timestamp)
+
+        return {
+            "latitude": lat,
+            "longitude": lon,
+            "altitude": altitude,
+            "gps_timestamp": gps_timestamp,
+            "captured_at": _exif_time(fields.get("captured_at")),
+            "digitized_at": _exif_time(fields.get("digitized_at")),
+            "modified_at": _exif_time(fields.get("modified_at")),
+            "make": _clean(fields.get("make")),
+            "model": _clean(fields.get("model")),
+            "lens_model": _clean(fields.get("lens_model")),
+            "body_serial": _clean(fields.get("body_serial")),
+            "software": _clean(fields.get("software")),
+        }
+
+    def _extract_metadata(self, image_file_path: str) -> Tuple[Dict, bool]:
+        """Returns (metadata, is_new); parses only on a cache miss and leaves persisting to the caller."""
+        with open(image_file_path, 'rb') as f:
+            data = f.read()
+        sha256 = hashlib.sha256(data).hexdigest()
+
+        cached = self.metadata_cache.get(sha256)
+        if cached is not None:
+            return dict(cached), False
+
+        metadata = self._parse_jpeg_metadata(data)
+        if metadata is None:
+            metadata = self._parse_pil_metadata(image_file_path)
+        metadata["sha256"] = sha256
+
+        with self._cache_lock:
+            self.metadata_cache[sha256] = metadata
+        return dict(metadata), True
+
+    def extract_image_metadata(self, image_file_path: str) -> Dict:
+        """
+        Returns location / capture-time / camera metadata for an image.
+        Results are cached by SHA-256 of the file content, so re-submitted or
+        re-imported photos are never parsed twice.
+        """
+        metadata, is_new = self._extract_metadata(image_file_path)
+        if is_new:
+            self._append_metadata_cache([metadata])
+        return metadata
+
+    def extract_metadata_bulk(self, image_paths: List[str], max_workers: Optional[int] = None) -> List[Dict]:
+        """Extracts metadata for many images in parallel, persisting new records in one append."""
+        def _extract(path):
+            try:
+                metadata, is_new = self._extract_metadata(path)
+                return {"file": path, **metadata}, is_new
+            except Exception as e:
+                return {"file": path, "error": str(e)}, False
+
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            outcomes = list(pool.map(_extract, image_paths))
+        self._append_metadata_cache([
+            {k: v for k, v in result.items() if k != "file"} for result, is_new in outcomes if is_new
+        ])
+        return [result for result, _ in outcomes]
+
     def _get_lat_lon(self, exif_data: Dict) -> Tuple[Optional[float], Optional[float]]:
         """Returns the latitude and longitude, if available, from the provided Exif data."""
         gps_info = exif_data.get("GPS", {})
         
         def _convert_to_degrees(value):
             """Helper function to convert the GPS coordinates stored in the EXIF to degrees in float format"""
+            if not isinstance(value, (tuple, list)) or len(value) != 3:
+                return None
             d = value[0] if isinstance(value[0], float) or isinstance(value[0], int) else float(value[0])
             m = value[1] if isinstance(value[1], float) or isinstance(value[1], int) else float(value[1])
             s = value[2] if isinstance(value[2], float) or isinstance(value[2], int) else float(value[2])
@@ -60,15 +326,21 @@ class ClaimsManager:
         lat = None
         lon = None
 
-        if "GPSLatitude" in gps_info and "GPSLatitudeRef" in gps_info:
-            lat = _convert_to_degrees(gps_info["GPSLatitude"])
-            if gps_info["GPSLatitudeRef"] != "N":
-                lat = -lat
+        try:
+            if "GPSLatitude" in gps_info and "GPSLatitudeRef" in gps_info:
+                lat = _convert_to_degrees(gps_info["GPSLatitude"])
+                if lat is not None and gps_info["GPSLatitudeRef"] != "N":
+                    lat = -lat
+        except (TypeError, ValueError):
+            lat = None
 
-        if "GPSLongitude" in gps_info and "GPSLongitudeRef" in gps_info:
-            lon = _convert_to_degrees(gps_info["GPSLongitude"])
-            if gps_info["GPSLongitudeRef"] != "E":
-                lon = -lon
+        try:
+            if "GPSLongitude" in gps_info and "GPSLongitudeRef" in gps_info:
+                lon = _convert_to_degrees(gps_info["GPSLongitude"])
+                if lon is not None and gps_info["GPSLongitudeRef"] != "E":
+                    lon = -lon
+        except (TypeError, ValueError):
+            lon = None
 
         return lat, lon
 
@@ -84,6 +356,39 @@ class ClaimsManager:
             # Fallback simple string
             return f"{lat:.2f},{lon:.2f}"
 
+    def _metadata_warnings(self, metadata: Dict, trusted_location: bool = False) -> List[str]:
+        """
+        Flags photo metadata patterns commonly seen in recycled or doctored evidence.
+        Live camera captures (canvas blobs) carry no EXIF at all, so a missing capture
+        time is only suspicious when EXIF exists and the client sent no coordinates.
+        """
+        warnings = []
+        software = metadata.get("software") or ""
+        if any(editor in software.lower() for editor in EDITING_SOFTWARE):
+            warnings.append(f"Photo was processed by editing software: {software}.")
+
+        captured_at = metadata.get("captured_at")
+        modified_at = metadata.get("modified_at")
+        if captured_at and modified_at:
+            try:
+                drift = abs((datetime.fromisoformat(modified_at) - datetime.fromisoformat(captured_at)).total_seconds())
+                if drift > EDIT_TIME_TOLERANCE_SECONDS:
+                    warnings.append(f"Photo was modified after capture (captured {captured_at}, modified {modified_at}).")
+            except ValueError:
+                pass
+
+        if not captured_at:
+            if metadata.get("has_exif") and not trusted_location:
+                warnings.append("No capture time found in photo metadata.")
+        else:
+            try:
+                age = datetime.now() - datetime.fromisoformat(captured_at)
+                if age.days > STALE_PHOTO_DAYS:
+                    warnings.append(f"Photo was captured {age.days} days before submission ({captured_at}).")
+            except ValueError:
+                warnings.append(f"Unreadable capture time in photo metadata ({captured_at}).")
+        return warnings
+
     def submit_claim(self, claim_data: Dict, image_file_path: str) -> Dict:
         """
         Validates and adds a claim.
@@ -101,10 +406,20 @@ class ClaimsManager:
 
         # 2. Image Processing
         try:
-            img = Image.open(image_file_path)
-            
-            # 2a. Duplicate Photo Check (Perceptual Hash)
-            img_hash = str(imagehash.phash(img))
+            # 2a. Metadata Extraction (header-only, cached by content hash)
+            metadata, is_new = self._extract_metadata(image_file_path)
+
+            # 2b. Duplicate Photo Check (Perceptual Hash) - only decodes pixels on a cache miss
+            img_hash = metadata.get("image_hash")
+            if img_hash is None:
+                with Image.open(image_file_path) as img:
+                    img_hash = str(imagehash.phash(img))
+                metadata["image_hash"] = img_hash
+                with self._cache_lock:
+                    self.metadata_cache[metadata["sha256"]] = dict(metadata)
+                is_new = True
+            if is_new:
+                self._append_metadata_cache([metadata])
             
             # Check against existing hashes
             for c in self.claims:
@@ -115,15 +430,16 @@ class ClaimsManager:
                         "details": f"This photo was already used in claim for Fund ID {c.get('fund_id')}."
                     }
             
-            # 2b. Metadata Extraction
-            exif = self._get_exif_data(img)
-            lat, lon = self._get_lat_lon(exif)
+            lat, lon = metadata["latitude"], metadata["longitude"]
 
             # Prioritize manual lat/long from trusted frontend source (Camera API)
-            if claim_data.get("latitude") is not None and claim_data.get("longitude") is not None:
+            trusted_location = claim_data.get("latitude") is not None and claim_data.get("longitude") is not None
+            if trusted_location:
                 lat = float(claim_data["latitude"])
                 lon = float(claim_data["longitude"])
 
+            warnings = self._metadata_warnings(metadata, trusted_location)
+
             geohash = self._get_geohash(lat, lon) if lat and lon else "UNKNOWN"
             
             timestamp = datetime.now().isoformat()
@@ -143,6 +459,7 @@ class ClaimsManager:
                 "image_path": image_file_path,  # Keep local path for serving
                 "s3_url": s3_url, # Storing the "Cloud" URL for audit trail
                 "image_hash": img_hash,
+                "photo_metadata": {k: v for k, v in metadata.items() if k != "image_hash"},
                 "location": {
                     "latitude": lat,
                     "longitude": lon,
@@ -163,7 +480,7 @@ class ClaimsManager:
                 "success": True, 
                 "message": "Claim submitted successfully", 
                 "claim_id": new_claim["claim_id"],
-                "warnings": [] if lat else ["No GPS data found in photo."]
+                "warnings": warnings if lat else ["No GPS data found in photo."] + warnings
             }
 
         except Exception as e:
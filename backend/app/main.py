@@ -1,12 +1,18 @@
 import uvicorn
 import io
+import asyncio
+import zipfile
+import tempfile
 import traceback
 import random
 import numpy as np
 import pandas as pd
-from typing import List, Tuple, Dict, Any
+from typing import List, Tuple, Dict, Any, Optional, Union
 from collections import defaultdict
-from fastapi import FastAPI, UploadFile, File, HTTPException, Form
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from fastapi import FastAPI, UploadFile, File, HTTPException, Form, Query
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 try:
     from sklearn.ensemble import IsolationForest
@@ -23,6 +29,12 @@ try:
     from .claims_manager import claims_manager
 except ImportError:
     from claims_manager import claims_manager
+try:
+    from .audit_store import audit_store
+    from .preprocess import NULL_IDENTIFIER_VALUES
+except ImportError:
+    from audit_store import audit_store
+    from preprocess import NULL_IDENTIFIER_VALUES
 import shutil
 import os
 import uuid
@@ -170,22 +182,38 @@ def ml_anomaly_score_rowwise(df: pd.DataFrame) -> Tuple[np.ndarray, float]:
 # ---------------------------------------------------------
 # 4. Graph / Network Analysis (shared links)
 # ---------------------------------------------------------
-def graph_risk_analysis(df: pd.DataFrame) -> Tuple[List[int], List[List[str]]]:
-    """Detects clusters of entities sharing identifiers like bank accounts or phones."""
-    IDENTIFIERS = ["bank account", "account no", "phone", "mobile", "aadhaar", "pan", "address"]
-    
-    available_cols = [c for c in IDENTIFIERS if c in df.columns]
-    network_scores = [0] * len(df)
-    network_links = [[] for _ in range(len(df))]
-    
-    if not available_cols:
-        return network_scores, network_links
+IDENTIFIERS = ["bank account", "account no", "phone", "mobile", "aadhaar", "pan", "address"]
 
+def build_identifier_index(df: pd.DataFrame) -> Dict[Tuple[str, str], List[int]]:
+    """Maps every normalized (identifier column, value) pair to the rows that carry it."""
+    available_cols = [c for c in IDENTIFIERS if c in df.columns]
     entity_map = defaultdict(list)
     for col in available_cols:
         for idx, val in enumerate(df[col].astype(str).str.strip().str.lower()):
-            if val and val not in ["nan", "unknown", "", "null", "none"]:
+            if val and val not in NULL_IDENTIFIER_VALUES:
                 entity_map[(col, val)].append(idx)
+    return entity_map
+
+def identifiers_by_row(entity_map: Dict[Tuple[str, str], List[int]], row_count: int) -> List[Dict[str, str]]:
+    """Inverts an identifier index into one {column: value} dict per row."""
+    row_identifiers = [{} for _ in range(row_count)]
+    for (col, val), rows in entity_map.items():
+        for r in rows:
+            row_identifiers[r][col] = val
+    return row_identifiers
+
+def graph_risk_analysis(
+    df: pd.DataFrame,
+    entity_map: Optional[Dict[Tuple[str, str], List[int]]] = None
+) -> Tuple[List[int], List[List[str]]]:
+    """Detects clusters of entities sharing identifiers like bank accounts or phones."""
+    network_scores = [0] * len(df)
+    network_links = [[] for _ in range(len(df))]
+
+    if entity_map is None:
+        entity_map = build_identifier_index(df)
+    if not entity_map:
+        return network_scores, network_links
 
     for (col, val), rows in entity_map.items():
         if len(rows) > 1:
@@ -200,6 +228,79 @@ def graph_risk_analysis(df: pd.DataFrame) -> Tuple[List[int], List[List[str]]]:
 # ---------------------------------------------------------
 # 5. Main API Endpoint
 # ---------------------------------------------------------
+def read_ledger_csv(source: Union[bytes, str]) -> pd.DataFrame:
+    """Parses CSV bytes or a CSV file path, falling back to latin-1 for legacy department exports."""
+    try:
+        return pd.read_csv(io.BytesIO(source) if isinstance(source, bytes) else source)
+    except:
+        return pd.read_csv(io.BytesIO(source) if isinstance(source, bytes) else source, encoding='latin-1')
+
+def format_exposure(total_high_risk_exposure: float) -> str:
+    """Formats an exposure amount in Crore / Lakh notation."""
+    if total_high_risk_exposure >= 10000000:
+        return f"₹{(total_high_risk_exposure / 10000000):.2f} Cr"
+    return f"₹{(total_high_risk_exposure / 100000):.2f} L"
+
+def combine_audit_signals(
+    df: pd.DataFrame,
+    rule_results: List[Dict],
+    ml_scores: np.ndarray,
+    precision_var: float,
+    network_scores: List[int],
+    network_links: List[List[str]],
+    row_identifiers: Optional[List[Dict[str, str]]] = None
+) -> Dict[str, Any]:
+    """Merges rule, ML and network signals into the final per-row audit report."""
+    final_results = []
+    total_high_risk_exposure = 0
+
+    # Combine Signals into Final Risk Score
+    for i in range(len(df)):
+        # Weighted aggregate: 45% Rules, 35% ML, 20% Network
+        risk_score = int(
+            (0.45 * rule_results[i]["rule_score"]) + 
+            (0.35 * ml_scores[i]) + 
+            (0.20 * network_scores[i])
+        )
+        
+        risk_score = max(0, min(100, risk_score))
+        
+        amount = float(df.iloc[i].get("amount", 0))
+        # Records > 75 Risk Score contribute to "System Exposure"
+        if risk_score > 75:
+            total_high_risk_exposure += amount
+
+        reasons = rule_results[i]["reasons"]
+        if ml_scores[i] > 60:
+            reasons.append(f"ML Anomaly: Behavior outlier (Confidence {ml_scores[i]}%)")
+        if network_scores[i] > 0:
+            reasons.append(f"Network: Identity sharing found ({len(network_links[i])} links)")
+
+        final_results.append({
+            "entity": str(df.iloc[i].get("entity")),
+            "amount": amount,
+            "department": str(df.iloc[i].get("department")).title(),
+            "risk_score": risk_score,
+            "rule_score": int(rule_results[i]["rule_score"]),
+            "ml_score": int(ml_scores[i]),
+            "network_score": int(network_scores[i]),
+            "network_links": network_links[i],
+            "identifiers": row_identifiers[i] if row_identifiers else {},
+            "reasons": reasons
+        })
+
+    # Model Precision (Error Rate) derived from ML variance
+    # We simulate a low error rate for good models (0.2% to 1.5%)
+    base_error = 0.2 + (precision_var * 1.3)
+    formatted_error = f"{min(base_error, 5.0):.2f}%"
+
+    return {
+        "results": sorted(final_results, key=lambda x: x["risk_score"], reverse=True),
+        "money_at_risk": format_exposure(total_high_risk_exposure),
+        "high_risk_count": len([x for x in final_results if x['risk_score'] > 75]),
+        "error_rate": formatted_error
+    }
+
 @app.post("/analyze")
 async def analyze_audit_data(file: UploadFile = File(...)):
     if not file.filename.endswith('.csv'):
@@ -207,11 +308,7 @@ async def analyze_audit_data(file: UploadFile = File(...)):
 
     try:
         content = await file.read()
-        
-        try:
-            df_raw = pd.read_csv(io.BytesIO(content))
-        except:
-            df_raw = pd.read_csv(io.BytesIO(content), encoding='latin-1')
+        df_raw = read_ledger_csv(content)
 
         if df_raw.empty:
             return {"error": "The uploaded CSV file contains no data."}
@@ -222,63 +319,18 @@ async def analyze_audit_data(file: UploadFile = File(...)):
         # Step 2: Multi-layer Analysis
         rule_results = apply_rules_rowwise(df)
         ml_scores, precision_var = ml_anomaly_score_rowwise(df)
-        network_scores, network_links = graph_risk_analysis(df)
-
-        final_results = []
-        total_high_risk_exposure = 0
-
-        # Step 3: Combine Signals into Final Risk Score
-        for i in range(len(df)):
-            # Weighted aggregate: 45% Rules, 35% ML, 20% Network
-            risk_score = int(
-                (0.45 * rule_results[i]["rule_score"]) + 
-                (0.35 * ml_scores[i]) + 
-                (0.20 * network_scores[i])
-            )
-            
-            risk_score = max(0, min(100, risk_score))
-            
-            amount = float(df.iloc[i].get("amount", 0))
-            # Records > 75 Risk Score contribute to "System Exposure"
-            if risk_score > 75:
-                total_high_risk_exposure += amount
-
-            reasons = rule_results[i]["reasons"]
-            if ml_scores[i] > 60:
-                reasons.append(f"ML Anomaly: Behavior outlier (Confidence {ml_scores[i]}%)")
-            if network_scores[i] > 0:
-                reasons.append(f"Network: Identity sharing found ({len(network_links[i])} links)")
-
-            final_results.append({
-                "entity": str(df.iloc[i].get("entity")),
-                "amount": amount,
-                "department": str(df.iloc[i].get("department")).title(),
-                "risk_score": risk_score,
-                "rule_score": int(rule_results[i]["rule_score"]),
-                "ml_score": int(ml_scores[i]),
-                "network_score": int(network_scores[i]),
-                "network_links": network_links[i],
-                "reasons": reasons
-            })
-
-        # Step 4: Formatting and Dashboard Statistics
-        # Exposure calculation
-        if total_high_risk_exposure >= 10000000:
-            formatted_exposure = f"₹{(total_high_risk_exposure / 10000000):.2f} Cr"
-        else:
-            formatted_exposure = f"₹{(total_high_risk_exposure / 100000):.2f} L"
-
-        # Model Precision (Error Rate) derived from ML variance
-        # We simulate a low error rate for good models (0.2% to 1.5%)
-        base_error = 0.2 + (precision_var * 1.3)
-        formatted_error = f"{min(base_error, 5.0):.2f}%"
+        entity_map = build_identifier_index(df)
+        network_scores, network_links = graph_risk_analysis(df, entity_map)
 
-        return {
-            "results": sorted(final_results, key=lambda x: x["risk_score"], reverse=True),
-            "money_at_risk": formatted_exposure,
-            "high_risk_count": len([x for x in final_results if x['risk_score'] > 75]),
-            "error_rate": formatted_error
-        }
+        # Step 3: Combine Signals and build Dashboard Statistics
+        report = combine_audit_signals(
+            df, rule_results, ml_scores, precision_var, network_scores, network_links,
+            identifiers_by_row(entity_map, len(df))
+        )
+
+        # Step 4: Persist this run and enrich it with risk from earlier runs
+        report["run_id"] = audit_store.record_runs([(file.filename, report)])[0]
+        return report
 
     except Exception as e:
         print("❌ CRITICAL ERROR DURING AUDIT PROCESSING:")
@@ -286,7 +338,271 @@ async def analyze_audit_data(file: UploadFile = File(...)):
         return {"error": "Internal Processing Error", "details": str(e)}
 
 # ---------------------------------------------------------
-# 6. Claims & Community Verification API
+# 6. Batch Audit (cross-file entity linkage)
+# ---------------------------------------------------------
+# Only these columns survive the worker stage; identifier values travel separately
+# through the shared index, so parent memory tracks identifiers rather than row width.
+LEDGER_SUMMARY_COLUMNS = ["entity", "amount", "department"]
+BATCH_AUDIT_WORKERS = int(os.getenv("BATCH_AUDIT_WORKERS", "0")) or (os.cpu_count() or 1)
+# Uploads and ZIP members are streamed to disk under these caps (guards against zip bombs)
+MAX_LEDGER_BYTES = int(os.getenv("MAX_LEDGER_BYTES", str(200 * 1024 * 1024)))
+MAX_BATCH_BYTES = int(os.getenv("MAX_BATCH_BYTES", str(1024 * 1024 * 1024)))
+COPY_CHUNK_BYTES = 1024 * 1024
+
+# One worker pool for the whole app: workers import this module once, not once per request
+_batch_pool: Optional[ProcessPoolExecutor] = None
+
+def get_batch_pool() -> ProcessPoolExecutor:
+    global _batch_pool
+    if _batch_pool is None:
+        _batch_pool = ProcessPoolExecutor(max_workers=BATCH_AUDIT_WORKERS)
+    return _batch_pool
+
+def discard_batch_pool(pool: ProcessPoolExecutor, wait: bool = False):
+    """Shuts a pool down (releasing its management thread and queues) and forgets it."""
+    global _batch_pool
+    pool.shutdown(wait=wait, cancel_futures=True)
+    if _batch_pool is pool:
+        _batch_pool = None
+
+@app.on_event("shutdown")
+def shutdown_batch_pool():
+    if _batch_pool is not None:
+        discard_batch_pool(_batch_pool, wait=True)
+
+def analyze_ledger_worker(file_name: str, path: str) -> Dict[str, Any]:
+    """Reads, cleans and locally scores one staged ledger file inside a worker process."""
+    try:
+        df_raw = read_ledger_csv(path)
+        if df_raw.empty:
+            return {"file": file_name, "error": "The uploaded CSV file contains no data."}
+
+        df = clean_data(df_raw)
+        rule_results = apply_rules_rowwise(df)
+        ml_scores, precision_var = ml_anomaly_score_rowwise(df)
+        identifier_index = build_identifier_index(df)
+
+        return {
+            "file": file_name,
+            "summary": df[[c for c in LEDGER_SUMMARY_COLUMNS if c in df.columns]].reset_index(drop=True),
+            "rule_results": rule_results,
+            "ml_scores": ml_scores,
+            "precision_var": precision_var,
+            "identifier_index": dict(identifier_index)
+        }
+    except Exception as e:
+        traceback.print_exc()
+        return {"file": file_name, "error": "Internal Processing Error", "details": str(e)}
+
+def cross_file_graph_analysis(
+    ledgers: List[Dict[str, Any]]
+) -> Tuple[List[List[int]], List[List[List[str]]], List[Dict[str, Any]]]:
+    """Links rows across ledgers through one shared identifier index.
+
+    Returns per-ledger network scores and links (same shape as graph_risk_analysis)
+    plus the connected clusters that span more than one file.
+    """
+    network_scores = [[0] * len(l["summary"]) for l in ledgers]
+    network_links = [[[] for _ in range(len(l["summary"]))] for l in ledgers]
+
+    # (column, value) -> [(ledger index, row index), ...]
+    shared_index = defaultdict(list)
+    for file_idx, ledger in enumerate(ledgers):
+        for key, rows in ledger["identifier_index"].items():
+            shared_index[key].extend((file_idx, r) for r in rows)
+
+    # Union-find over (ledger, row) nodes so transitive links form one cluster
+    parent: Dict[Tuple[int, int], Tuple[int, int]] = {}
+
+    def find(node):
+        parent.setdefault(node, node)
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    cluster_keys = defaultdict(list)
+    for (col, val), nodes in shared_index.items():
+        if len(nodes) < 2:
+            continue
+
+        risk = min(100, 30 + (len(nodes) * 10))
+        file_count = len({f for f, _ in nodes})
+        scope = f" across {file_count} file(s)" if file_count > 1 else ""
+        for f, r in nodes:
+            network_scores[f][r] = max(network_scores[f][r], risk)
+            network_links[f][r].append(f"Linked via {col.upper()} ({val}) to {len(nodes) - 1} other entity(s){scope}")
+
+        root = find(nodes[0])
+        for node in nodes[1:]:
+            other = find(node)
+            if other != root:
+                parent[other] = root
+        cluster_keys[nodes[0]].append((col, val))
+
+    members = defaultdict(list)
+    for node in parent:
+        members[find(node)].append(node)
+    identifiers = defaultdict(list)
+    for node, keys in cluster_keys.items():
+        identifiers[find(node)].extend(keys)
+
+    clusters = []
+    for root, nodes in members.items():
+        files = sorted({f for f, _ in nodes})
+        if len(files) < 2:
+            continue
+        clusters.append({
+            "files": [ledgers[f]["file"] for f in files],
+            "size": len(nodes),
+            "network_score": max(network_scores[f][r] for f, r in nodes),
+            "shared_identifiers": [f"{col.upper()} ({val})" for col, val in identifiers[root]],
+            "entities": [
+                {
+                    "file": ledgers[f]["file"],
+                    "entity": str(ledgers[f]["summary"].iloc[r].get("entity")),
+                    "department": str(ledgers[f]["summary"].iloc[r].get("department")).title()
+                }
+                for f, r in sorted(nodes)
+            ]
+        })
+
+    clusters.sort(key=lambda c: (c["network_score"], c["size"]), reverse=True)
+    for i, cluster in enumerate(clusters):
+        cluster["cluster_id"] = f"XC-{i + 1:04d}"
+
+    return network_scores, network_links, clusters
+
+def _stage_stream(src, dest_path: str, limit: int, label: str) -> int:
+    """Copies a file-like object to disk in chunks, refusing to write more than `limit` bytes."""
+    written = 0
+    with open(dest_path, "wb") as out:
+        while True:
+            chunk = src.read(COPY_CHUNK_BYTES)
+            if not chunk:
+                break
+            written += len(chunk)
+            if written > limit:
+                raise HTTPException(status_code=413, detail=f"{label} exceeds the batch size limit.")
+            out.write(chunk)
+    return written
+
+def stage_batch_upload(upload: UploadFile, workdir: str, budget: List[int]) -> List[Tuple[str, str]]:
+    """
+    Streams an uploaded CSV, or the CSV members of a ZIP archive, into `workdir`.
+    Returns (name, path) ledger entries; `budget` holds the bytes still allowed for this batch.
+    """
+    file_name = upload.filename
+    lower_name = file_name.lower()
+    if not lower_name.endswith(('.csv', '.zip')):
+        raise HTTPException(status_code=400, detail=f"Invalid file type for {file_name}. Please upload CSV or ZIP files.")
+
+    path = os.path.join(workdir, f"{uuid.uuid4().hex}{os.path.splitext(lower_name)[1]}")
+    if lower_name.endswith('.csv'):
+        budget[0] -= _stage_stream(upload.file, path, min(MAX_LEDGER_BYTES, budget[0]), file_name)
+        return [(file_name, path)]
+
+    # The archive itself is only a container; its bytes don't count against the extraction budget
+    _stage_stream(upload.file, path, MAX_BATCH_BYTES, file_name)
+    ledgers = []
+    try:
+        with zipfile.ZipFile(path) as archive:
+            for member in archive.infolist():
+                if member.is_dir() or not member.filename.lower().endswith('.csv'):
+                    continue
+                label = f"{file_name}/{member.filename}"
+                # Declared sizes can lie, so _stage_stream also enforces the cap while inflating
+                if member.file_size > min(MAX_LEDGER_BYTES, budget[0]):
+                    raise HTTPException(status_code=413, detail=f"{label} exceeds the batch size limit.")
+                member_path = os.path.join(workdir, f"{uuid.uuid4().hex}.csv")
+                with archive.open(member) as src:
+                    budget[0] -= _stage_stream(src, member_path, min(MAX_LEDGER_BYTES, budget[0]), label)
+                ledgers.append((label, member_path))
+    except zipfile.BadZipFile:
+        raise HTTPException(status_code=400, detail=f"{file_name} is not a valid ZIP archive.")
+    finally:
+        os.remove(path)
+    return ledgers
+
+def stage_batch_uploads(files: List[UploadFile], workdir: str) -> List[Tuple[str, str]]:
+    """Stages every upload of a batch under one shared size budget (blocking; run off the event loop)."""
+    budget = [MAX_BATCH_BYTES]
+    ledger_paths = []
+    for upload in files:
+        ledger_paths.extend(stage_batch_upload(upload, workdir, budget))
+    return ledger_paths
+
+async def run_ledger_workers(ledger_paths: List[Tuple[str, str]]) -> List[Dict[str, Any]]:
+    """Fans staged ledgers out to the shared worker pool; a failed ledger becomes a per-file error."""
+    loop = asyncio.get_running_loop()
+    pool = get_batch_pool()
+    outcomes = await asyncio.gather(*[
+        loop.run_in_executor(pool, analyze_ledger_worker, name, path)
+        for name, path in ledger_paths
+    ], return_exceptions=True)
+
+    if any(isinstance(o, BrokenProcessPool) for o in outcomes):
+        # A crashed worker poisons the pool; replace it so the next request starts a fresh one
+        discard_batch_pool(pool)
+
+    return [
+        {"file": name, "error": "Internal Processing Error", "details": str(o) or type(o).__name__}
+        if isinstance(o, BaseException) else o
+        for (name, _), o in zip(ledger_paths, outcomes)
+    ]
+
+def merge_batch_outcomes(outcomes: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Links, scores and persists worker outcomes (blocking; run off the event loop)."""
+    ledgers = [o for o in outcomes if "error" not in o]
+    failed = [o for o in outcomes if "error" in o]
+
+    # Step 2: Link entities through one identifier index shared by all ledgers
+    network_scores, network_links, clusters = cross_file_graph_analysis(ledgers)
+
+    # Step 3: Combine signals per ledger
+    file_reports = []
+    total_high_risk_exposure = 0
+    for i, ledger in enumerate(ledgers):
+        report = combine_audit_signals(
+            ledger["summary"], ledger["rule_results"], ledger["ml_scores"],
+            ledger["precision_var"], network_scores[i], network_links[i],
+            identifiers_by_row(ledger["identifier_index"], len(ledger["summary"]))
+        )
+        total_high_risk_exposure += sum(r["amount"] for r in report["results"] if r["risk_score"] > 75)
+        file_reports.append({"file": ledger["file"], **report})
+
+    # Step 4: Persist each ledger as its own audit run (one transaction) and enrich with history
+    run_ids = audit_store.record_runs([(r["file"], r) for r in file_reports], source="batch")
+    for report, run_id in zip(file_reports, run_ids):
+        report["run_id"] = run_id
+
+    return {
+        "files": file_reports + failed,
+        "cross_file_clusters": clusters,
+        "money_at_risk": format_exposure(total_high_risk_exposure),
+        "high_risk_count": sum(r["high_risk_count"] for r in file_reports),
+        "files_processed": len(file_reports)
+    }
+
+@app.post("/analyze-batch")
+async def analyze_audit_batch(files: List[UploadFile] = File(...)):
+    with tempfile.TemporaryDirectory(prefix="batch_audit_") as workdir:
+        ledger_paths = await run_in_threadpool(stage_batch_uploads, files, workdir)
+        if not ledger_paths:
+            raise HTTPException(status_code=400, detail="No CSV ledgers found in the upload.")
+
+        try:
+            # Step 1: Read, clean and locally score every ledger in parallel worker processes
+            outcomes = await run_ledger_workers(ledger_paths)
+            return await run_in_threadpool(merge_batch_outcomes, outcomes)
+
+        except Exception as e:
+            print("❌ CRITICAL ERROR DURING BATCH AUDIT PROCESSING:")
+            traceback.print_exc()
+            return {"error": "Internal Processing Error", "details": str(e)}
+
+# ---------------------------------------------------------
+# 7. Claims & Community Verification API
 # ---------------------------------------------------------
 
 @app.post("/submit-claim")
@@ -333,10 +649,58 @@ def get_claims():
         traceback.print_exc()
         return []
 
+EVIDENCE_ROOT = "uploaded_images"
+EVIDENCE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.tif', '.tiff', '.webp')
+# Server-side only: extraction is I/O bound, so a few threads per core, capped
+EVIDENCE_METADATA_WORKERS = int(os.getenv("EVIDENCE_METADATA_WORKERS", "0")) or min(32, (os.cpu_count() or 1) * 4)
+
+@app.post("/extract-metadata")
+def extract_evidence_metadata(directory: str = Form(default="")):
+    root = os.path.realpath(EVIDENCE_ROOT)
+    target = os.path.realpath(os.path.join(root, directory))
+    if os.path.commonpath([root, target]) != root or not os.path.isdir(target):
+        raise HTTPException(status_code=400, detail="Directory must be an existing folder inside uploaded_images.")
+
+    image_paths = sorted(
+        os.path.join(target, name) for name in os.listdir(target)
+        if name.lower().endswith(EVIDENCE_EXTENSIONS)
+    )
+    results = claims_manager.extract_metadata_bulk(image_paths, max_workers=EVIDENCE_METADATA_WORKERS)
+    for r in results:
+        r["file"] = os.path.relpath(r["file"], root)
+    return {"directory": os.path.relpath(target, root), "count": len(results), "results": results}
+
 @app.post("/verify-claim/{claim_id}")
 async def verify_claim(claim_id: str, action: str = Form(...), notes: str = Form(default="")):
     success, msg = claims_manager.update_claim_status(claim_id, action, notes)
     return {"success": success, "message": msg}
 
+# ---------------------------------------------------------
+# 8. Audit History API
+# ---------------------------------------------------------
+
+@app.get("/audit-runs")
+def get_audit_runs(limit: int = Query(20, ge=1, le=500)):
+    return audit_store.list_runs(limit)
+
+@app.get("/audit-history/entity/{entity}")
+def get_entity_history(entity: str, limit: int = Query(100, ge=1, le=1000)):
+    return audit_store.entity_history(entity, limit)
+
+@app.get("/audit-history/identifier")
+def get_identifier_history(identifier: str, value: str, limit: int = Query(100, ge=1, le=1000)):
+    if identifier.strip().lower() not in IDENTIFIERS:
+        raise HTTPException(status_code=400, detail=f"Unknown identifier. Expected one of: {', '.join(IDENTIFIERS)}")
+    return audit_store.identifier_history(identifier, value, limit)
+
+@app.get("/audit-history/top-entities")
+def get_top_risky_entities(
+    last_n: int = Query(5, ge=1, le=100),
+    limit: int = Query(20, ge=1, le=500),
+    min_risk: int = Query(0, ge=0, le=100),
+    department: Optional[str] = None
+):
+    return audit_store.top_risky_entities(last_n, limit, min_risk, department)
+
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -1,5 +1,9 @@
 import pandas as pd
 
+# Values that mean "no data" once a ledger has been cleaned (fillna writes "UNKNOWN").
+# Rows carrying them share nothing real, so they must never be used to link records.
+NULL_IDENTIFIER_VALUES = {"nan", "unknown", "", "null", "none"}
+
 def clean_data(df: pd.DataFrame) -> pd.DataFrame:
     df = df.copy()
 
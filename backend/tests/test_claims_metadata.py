@@ -0,0 +1,135 @@
+import struct
+
+import pytest
+
+from app.claims_manager import ClaimsManager
+
+
+def _ifd(endian, entries, base):
+    """Packs (tag, type, count, raw bytes) entries into an IFD placed at `base`."""
+    out = struct.pack(endian + "H", len(entries))
+    extra = b""
+    data_offset = base + 2 + 12 * len(entries) + 4
+    for tag, field_type, count, raw in entries:
+        out += struct.pack(endian + "HHI", tag, field_type, count)
+        if len(raw) <= 4:
+            out += raw.ljust(4, b"\x00")
+        else:
+            out += struct.pack(endian + "I", data_offset + len(extra))
+            extra += raw
+    return out + b"\x00\x00\x00\x00" + extra
+
+
+def _rational(endian, *pairs):
+    return b"".join(struct.pack(endian + "II", n, d) for n, d in pairs)
+
+
+def _jpeg(tiff):
+    app1 = b"Exif\x00\x00" + tiff
+    return (b"\xff\xd8"
+            + b"\xff\xe1" + struct.pack(">H", len(app1) + 2) + app1
+            + b"\xff\xda\x00\x02" + b"\x00" * 16 + b"\xff\xd9")
+
+
+def _exif_tiff(endian, gps_entries=None):
+    """IFD0 (Make, Software, DateTime) -> Exif IFD (DateTimeOriginal) and GPS IFD."""
+    make = b"Canon\x00"
+    software = b"17.1.2\x00"
+    modified = b"2026:01:02 10:05:30\x00"
+    if gps_entries is None:
+        gps_entries = [
+            (1, 2, 2, b"S\x00"),
+            (2, 5, 3, _rational(endian, (12, 1), (30, 1), (36, 1))),
+            (3, 2, 2, b"E\x00"),
+            (4, 5, 3, _rational(endian, (77, 1), (15, 1), (0, 1))),
+        ]
+
+    ifd0_size = 2 + 12 * 5 + 4 + len(make) + len(software) + len(modified)
+    exif_offset = 8 + ifd0_size
+    exif_blob = _ifd(endian, [(0x9003, 2, 20, b"2026:01:02 10:05:03\x00")], exif_offset)
+    gps_offset = exif_offset + len(exif_blob)
+    gps_blob = _ifd(endian, gps_entries, gps_offset)
+    ifd0_blob = _ifd(endian, [
+        (0x010F, 2, len(make), make),
+        (0x0131, 2, len(software), software),
+        (0x0132, 2, len(modified), modified),
+        (0x8769, 4, 1, struct.pack(endian + "I", exif_offset)),
+        (0x8825, 4, 1, struct.pack(endian + "I", gps_offset)),
+    ], 8)
+    order = b"II\x2a\x00" if endian == "<" else b"MM\x00\x2a"
+    return order + struct.pack(endian + "I", 8) + ifd0_blob + exif_blob + gps_blob
+
+
+@pytest.fixture
+def manager(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return ClaimsManager()
+
+
+@pytest.mark.parametrize("endian", ["<", ">"])
+def test_reads_gps_and_camera_fields_in_both_byte_orders(manager, endian):
+    metadata = manager._parse_jpeg_metadata(_jpeg(_exif_tiff(endian)))
+
+    assert metadata["has_exif"] is True
+    assert metadata["latitude"] == pytest.approx(-12.51)
+    assert metadata["longitude"] == pytest.approx(77.25)
+    assert metadata["captured_at"] == "2026-01-02T10:05:03"
+    assert metadata["modified_at"] == "2026-01-02T10:05:30"
+    assert metadata["make"] == "Canon"
+    assert metadata["software"] == "17.1.2"
+
+
+def test_bogus_ifd0_offset_is_not_exif(manager):
+    tiff = bytearray(_exif_tiff("<"))
+    tiff[4:8] = struct.pack("<I", 10_000)
+    metadata = manager._parse_jpeg_metadata(_jpeg(bytes(tiff)))
+
+    assert metadata["has_exif"] is False
+    assert metadata["captured_at"] is None
+
+
+def test_truncated_ifd0_is_not_exif(manager):
+    metadata = manager._parse_jpeg_metadata(_jpeg(_exif_tiff(">")[:30]))
+
+    assert metadata["has_exif"] is False
+    assert metadata["latitude"] is None
+
+
+def test_malformed_optional_gps_fields_become_none(manager):
+    gps_entries = [
+        (1, 2, 2, b"N\x00"),
+        (2, 5, 2, _rational("<", (1, 1), (2, 1))),    # latitude with 2 components
+        (3, 2, 2, b"E\x00"),
+        (4, 5, 3, _rational("<", (77, 1), (15, 1), (0, 1))),
+        (7, 5, 2, _rational("<", (1, 1), (2, 1))),    # time stamp with 2 components
+        (0x1D, 2, 1, b"\x00"),                         # empty date stamp
+    ]
+    metadata = manager._parse_jpeg_metadata(_jpeg(_exif_tiff("<", gps_entries)))
+
+    assert metadata["latitude"] is None
+    assert metadata["longitude"] == pytest.approx(77.25)
+    assert metadata["gps_timestamp"] is None
+
+
+def test_jpeg_without_app1_and_non_jpeg(manager):
+    metadata = manager._parse_jpeg_metadata(b"\xff\xd8\xff\xda\x00\x02\xff\xd9")
+    assert metadata["has_exif"] is False
+    assert manager._parse_jpeg_metadata(b"\x89PNG\r\n\x1a\n") is None
+
+
+def test_warnings_ignore_firmware_software_and_flag_edits(manager):
+    base = {"has_exif": True, "captured_at": "2099-01-01T10:00:00", "modified_at": "2099-01-01T10:00:00"}
+
+    assert manager._metadata_warnings({**base, "software": "17.1.2"}) == []
+    assert manager._metadata_warnings({**base, "software": "Adobe Photoshop 25.0"}) == [
+        "Photo was processed by editing software: Adobe Photoshop 25.0."
+    ]
+    assert manager._metadata_warnings({**base, "modified_at": "2099-01-03T09:00:00"}) == [
+        "Photo was modified after capture (captured 2099-01-01T10:00:00, modified 2099-01-03T09:00:00)."
+    ]
+
+
+def test_missing_capture_time_only_warns_for_untrusted_exif(manager):
+    assert manager._metadata_warnings({"has_exif": False}) == []
+    assert manager._metadata_warnings({"has_exif": True}, trusted_location=True) == []
+    assert manager._metadata_warnings({"has_exif": True}) == ["No capture time found in photo metadata."]